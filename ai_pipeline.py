@@ -5,8 +5,15 @@
 # ------------------------------------------------------------
 
 from __future__ import annotations
-import json, os, requests
-from typing import Any, Dict, List, Optional
+import asyncio, json, os
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Awaitable, Dict, List, Optional, TypeVar
+
+from bloom import VERBS
+from course_index import retrieve_context, retrieve_for_topics
+
+if TYPE_CHECKING:
+    import httpx  # imported lazily in _client() to keep `import ai_pipeline` cheap
 
 # ------------------------
 # Configuration
@@ -14,47 +21,249 @@ from typing import Any, Dict, List, Optional
 OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434/api/generate")
 MODEL_BRAINSTORM = os.getenv("LLM_BRAINSTORM", "mistral")  # For idea generation
 MODEL_NORMALIZE = os.getenv("LLM_NORMALIZE", "phi3:mini")  # For cleanup/JSON enforcement
+CONTEXT_CHUNKS = int(os.getenv("LLM_CONTEXT_CHUNKS", "4"))  # Course chunks injected per topic
+NUM_CTX = int(os.getenv("LLM_NUM_CTX", "4096"))  # Context window requested from Ollama (fixed: changing it reloads the model)
+RESERVED_TOKENS = int(os.getenv("LLM_RESERVED_TOKENS", "2048"))  # Instructions + topic + generated output
+# Injected material never exceeds what fits beside the reserve, so Ollama
+# never truncates the start of the prompt (and with it the shared prefix).
+CONTEXT_TOKEN_BUDGET = min(int(os.getenv("LLM_CONTEXT_BUDGET", "1200")), max(0, NUM_CTX - RESERVED_TOKENS))
+KEEP_ALIVE = os.getenv("LLM_KEEP_ALIVE", "10m")  # Keep model + prompt cache loaded between calls
+MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "2"))  # In-flight Ollama requests per event loop
+REPAIR_ROUNDS = int(os.getenv("LLM_REPAIR_ROUNDS", "1"))  # Regenerate MCQs failing quality checks (0 = off)
+
+T = TypeVar("T")
 
 
 # ------------------------
-# Helper function to call Ollama
+# Timing statistics
 # ------------------------
-def run_ollama(model: str, prompt: str) -> str:
-    """Call Ollama model and return raw text output."""
-    payload = {"model": model, "prompt": prompt}
-    response = requests.post(OLLAMA_URL, json=payload, timeout=300)
+@dataclass
+class GenerationStats:
+    """
+    Accumulated Ollama timings for a batch, with prompt evaluation
+    reported separately from generation. Durations are in seconds.
+    """
+    calls: int = 0
+    prompt_tokens: int = 0
+    prompt_eval_s: float = 0.0
+    gen_tokens: int = 0
+    gen_s: float = 0.0
+    total_s: float = 0.0
+
+    def record(self, resp: Dict[str, Any]) -> None:
+        # Ollama reports durations in nanoseconds. Cached prefix tokens are
+        # not counted in prompt_eval_count, so a warm prefix shows up here.
+        self.calls += 1
+        self.prompt_tokens += int(resp.get("prompt_eval_count") or 0)
+        self.prompt_eval_s += (resp.get("prompt_eval_duration") or 0) / 1e9
+        self.gen_tokens += int(resp.get("eval_count") or 0)
+        self.gen_s += (resp.get("eval_duration") or 0) / 1e9
+        self.total_s += (resp.get("total_duration") or 0) / 1e9
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "prompt_eval_s": round(self.prompt_eval_s, 3),
+            "gen_tokens": self.gen_tokens,
+            "gen_s": round(self.gen_s, 3),
+            "total_s": round(self.total_s, 3),
+        }
+
+
+# ------------------------
+# Shared HTTP client & concurrency limit
+# ------------------------
+# One pooled AsyncClient and one semaphore per event loop: asyncio objects
+# cannot be shared across loops, and each sync wrapper runs its own loop.
+_clients: Dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+_semaphores: Dict[asyncio.AbstractEventLoop, asyncio.Semaphore] = {}
+
+
+def _client() -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        import httpx
+        client = httpx.AsyncClient(
+            timeout=300,
+            limits=httpx.Limits(max_connections=MAX_CONCURRENCY, max_keepalive_connections=MAX_CONCURRENCY),
+        )
+        _clients[loop] = client
+    return client
+
+
+def _semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    if loop not in _semaphores:
+        _semaphores[loop] = asyncio.Semaphore(MAX_CONCURRENCY)
+    return _semaphores[loop]
+
+
+async def aclose_client() -> None:
+    """Close the pooled client for the running loop (call on service shutdown)."""
+    loop = asyncio.get_running_loop()
+    _semaphores.pop(loop, None)
+    client = _clients.pop(loop, None)
+    if client is not None:
+        await client.aclose()
+
+
+def _run_sync(coro: Awaitable[T]) -> T:
+    """Run a coroutine to completion from sync code, closing its client after."""
+    async def runner() -> T:
+        try:
+            return await coro
+        finally:
+            await aclose_client()
+    return asyncio.run(runner())
+
+
+# ------------------------
+# Helper functions to call Ollama
+# ------------------------
+async def acall_ollama(model: str, prompt: str, stats: Optional[GenerationStats] = None) -> Dict[str, Any]:
+    """
+    Call Ollama (non-streaming) and return the full JSON response,
+    including timing fields. `keep_alive` keeps the model and its prompt
+    cache resident, so calls sharing a prompt prefix skip re-evaluating it.
+
+    At most MAX_CONCURRENCY calls run at once per event loop. Cancelling
+    the awaiting task closes the connection, which stops generation.
+    """
+    payload = {
+        "model": model, "prompt": prompt, "stream": False, "keep_alive": KEEP_ALIVE,
+        "options": {"num_ctx": NUM_CTX},
+    }
+    async with _semaphore():
+        response = await _client().post(OLLAMA_URL, json=payload)
     response.raise_for_status()
-    result = response.text.split('"response":"')[-1]
-    return result.replace('"}', '').strip()
+    data = response.json()
+    if stats is not None:
+        stats.record(data)
+    return data
+
+
+async def arun_ollama(model: str, prompt: str, stats: Optional[GenerationStats] = None) -> str:
+    """Async variant of run_ollama."""
+    return (await acall_ollama(model, prompt, stats)).get("response", "").strip()
+
+
+def call_ollama(model: str, prompt: str, stats: Optional[GenerationStats] = None) -> Dict[str, Any]:
+    """Sync wrapper around acall_ollama."""
+    return _run_sync(acall_ollama(model, prompt, stats))
+
+
+def run_ollama(model: str, prompt: str, stats: Optional[GenerationStats] = None) -> str:
+    """Call Ollama model and return raw text output."""
+    return _run_sync(arun_ollama(model, prompt, stats))
 
 
 # ------------------------
-# Pipeline functions
+# Prompt size control
 # ------------------------
-def brainstorm_questions(topic: str, bloom: str, count: int = 10) -> List[Dict[str, Any]]:
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English text)."""
+    return len(text) // 4 + 1
+
+
+def trim_to_budget(chunks: List[str], budget: int = CONTEXT_TOKEN_BUDGET) -> List[str]:
     """
-    Generate draft MCQs or activities using the brainstorm model (Mistral).
+    Keep chunks in rank order until `budget` tokens are used; the last
+    chunk that does not fit is cut at a word boundary.
     """
-    prompt = f"""
-    Generate {count} {bloom}-level multiple choice questions for the topic "{topic}".
+    kept: List[str] = []
+    remaining = budget
+    for chunk in chunks:
+        cost = estimate_tokens(chunk)
+        if cost <= remaining:
+            kept.append(chunk)
+            remaining -= cost
+            continue
+        if remaining > 20:
+            cut = chunk[: remaining * 4].rsplit(" ", 1)[0]
+            kept.append(cut + " …")
+        break
+    return kept
+
+
+def batch_chunk_count(n_topics: int) -> int:
+    """Number of course chunks to retrieve for a batch of `n_topics` topics (see retrieve_for_topics)."""
+    return max(CONTEXT_CHUNKS, 2 * n_topics)
+
+
+def course_material_block(query: str, course_code: Optional[str], k: int = CONTEXT_CHUNKS) -> str:
+    """
+    Return a prompt section with the most relevant indexed course chunks
+    for `query`, trimmed to the token budget, or an empty string if the
+    course has no material.
+    """
+    return material_block(retrieve_context(course_code, query, k))
+
+
+def material_block(chunks: List[str]) -> str:
+    """Prompt section for already-retrieved chunks, trimmed to the token budget."""
+    chunks = trim_to_budget(chunks)
+    if not chunks:
+        return ""
+    body = "\n---\n".join(chunks)
+    return f"""
+    Base the items only on the following course material:
+    ---
+    {body}
+    ---
+    """
+
+
+# ------------------------
+# Prompt templates
+# ------------------------
+# The shared part of each prompt comes first and the topic last, so every
+# call in a batch starts with an identical prefix that Ollama can reuse.
+# The rules mirror the checks in quality.py, so fewer items need repair.
+def question_preamble(bloom: str, count: int, material: str = "",
+                      verbs: Optional[List[str]] = None) -> str:
+    allowed = ", ".join(verbs or VERBS.get(bloom, []))
+    verb_rule = f"\n    Each question must use one of these verbs: {allowed}." if allowed else ""
+    return material + f"""
+    Generate {count} {bloom}-level multiple choice questions for the topic given below.{verb_rule}
+    Each question must have exactly 4 distinct options, without A)-D) labels.
+    The answer must be the single letter (A, B, C or D) of the correct option.
     Each item should be formatted in JSON with:
       - question
       - options (list of 4)
       - answer (letter)
-      - bloom_level
+      - bloom_level ("{bloom}")
       - rationale (short)
     Do not include explanations outside JSON.
     """
-    text = run_ollama(MODEL_BRAINSTORM, prompt)
-    return normalize_json(text)
 
 
-def brainstorm_activities(topic: str, bloom: str, count: int = 5) -> List[Dict[str, Any]]:
-    """
-    Generate learning activities instead of MCQs.
-    """
-    prompt = f"""
-    Suggest {count} {bloom}-level learning activities for "{topic}".
+# What each failed quality.py check asks the model to fix on a repair pass
+REPAIR_HINTS = {
+    "structure": "a non-empty question with exactly 4 non-empty options",
+    "answer_letter": "the answer is a single letter A-D",
+    "unique_options": "the 4 options are all different",
+    "bloom_level": "bloom_level matches the requested level",
+    "verb_aligned": "the question uses one of the listed verbs",
+    "length_balanced": "options are of similar length",
+    "answer_not_longest": "the correct option is not the longest one",
+}
+
+
+def repair_note(checks: List[str]) -> str:
+    """Prompt lines naming the checks the previous attempt failed."""
+    hints = [REPAIR_HINTS[c] for c in REPAIR_HINTS if c in checks]
+    if not hints:
+        return ""
+    return "Earlier attempts failed these checks; make sure that:\n" + "".join(
+        f"      - {h}\n" for h in hints
+    )
+
+
+def activity_preamble(bloom: str, count: int, material: str = "") -> str:
+    return material + f"""
+    Suggest {count} {bloom}-level learning activities for the topic given below.
     Return valid JSON:
       - title
       - description
@@ -62,14 +271,160 @@ def brainstorm_activities(topic: str, bloom: str, count: int = 5) -> List[Dict[s
       - bloom_level
     No prose or markdown, just JSON.
     """
-    text = run_ollama(MODEL_BRAINSTORM, prompt)
-    return normalize_json(text)
+
+
+def topic_suffix(topic: str) -> str:
+    return f'Topic: "{topic}"\n'
+
+
+# ------------------------
+# Pipeline functions (async)
+# ------------------------
+async def abrainstorm_questions(
+    topic: str,
+    bloom: str,
+    count: int = 10,
+    course_code: Optional[str] = None,
+    stats: Optional[GenerationStats] = None,
+    verbs: Optional[List[str]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Generate draft MCQs or activities using the brainstorm model (Mistral).
+    If `course_code` has indexed material, the top chunks for the topic are
+    included in the prompt. Items failing the local quality checks are
+    regenerated (see arepair_questions).
+    """
+    material = await asyncio.to_thread(course_material_block, topic, course_code)
+    prompt = question_preamble(bloom, count, material, verbs) + topic_suffix(topic)
+    text = await arun_ollama(MODEL_BRAINSTORM, prompt, stats)
+    items = await anormalize_json(text, stats)
+    return await arepair_questions(items, topic, bloom, material, verbs, stats=stats)
+
+
+async def abrainstorm_activities(
+    topic: str,
+    bloom: str,
+    count: int = 5,
+    course_code: Optional[str] = None,
+    stats: Optional[GenerationStats] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Generate learning activities instead of MCQs.
+    """
+    material = await asyncio.to_thread(course_material_block, topic, course_code)
+    prompt = activity_preamble(bloom, count, material) + topic_suffix(topic)
+    text = await arun_ollama(MODEL_BRAINSTORM, prompt, stats)
+    return await anormalize_json(text, stats)
+
+
+async def abrainstorm_batch(
+    topics: List[str],
+    bloom: str,
+    count: int = 10,
+    course_code: Optional[str] = None,
+    kind: str = "questions",
+    stats: Optional[GenerationStats] = None,
+    material: Optional[List[str]] = None,
+    verbs: Optional[List[str]] = None,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Generate items for several topics with one shared prompt prefix.
+
+    Course material is retrieved once for the whole batch (per topic, then
+    interleaved so trimming keeps every topic represented) and placed in the
+    preamble, so only the short topic line differs between calls and Ollama
+    evaluates the preamble once. Only the first topic's brainstorm call runs
+    alone, to warm that prefix; everything else (the other brainstorms and
+    every topic's normalise/repair steps) runs concurrently, bounded by
+    MAX_CONCURRENCY, and is cancelled together if any of it fails. Pass
+    `stats` to collect prompt-eval vs generation timings.
+
+    `material` supplies already-retrieved chunks (e.g. from a UI that owns
+    the index); otherwise they are looked up for `course_code` locally.
+    `verbs` (the instructor's selection) is what MCQ repair checks against.
+    """
+    if not topics:
+        return {}
+    if material is not None:
+        block = material_block(material)
+    else:
+        # Disk read + BM25 run in a worker thread so the event loop keeps serving
+        material = await asyncio.to_thread(
+            retrieve_for_topics, course_code, topics, batch_chunk_count(len(topics))
+        )
+        block = material_block(material)
+    if kind == "questions":
+        preamble = question_preamble(bloom, count, block, verbs)
+    else:
+        preamble = activity_preamble(bloom, count, block)
+
+    async def one(topic: str, text: Optional[str] = None) -> List[Dict[str, Any]]:
+        if text is None:
+            text = await arun_ollama(MODEL_BRAINSTORM, preamble + topic_suffix(topic), stats)
+        items = await anormalize_json(text, stats)
+        if kind == "questions":
+            items = await arepair_questions(items, topic, bloom, block, verbs, stats=stats)
+        return items
+
+    warm = await arun_ollama(MODEL_BRAINSTORM, preamble + topic_suffix(topics[0]), stats)
+    tasks = [asyncio.ensure_future(one(topics[0], warm))]
+    tasks += [asyncio.ensure_future(one(t)) for t in topics[1:]]
+    try:
+        results = await asyncio.gather(*tasks)
+    except BaseException:
+        # One topic failed (or the batch was cancelled): stop the others too
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    return dict(zip(topics, results))
+
+
+async def arepair_questions(
+    items: Any,
+    topic: str,
+    bloom: str,
+    material: str = "",
+    verbs: Optional[List[str]] = None,
+    rounds: int = REPAIR_ROUNDS,
+    stats: Optional[GenerationStats] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Score MCQs with the local heuristics in quality.py and regenerate only
+    the items that fail, for up to `rounds` passes. Passing items are kept
+    as-is; the replacement prompt reuses the batch's material prefix.
+    A replacement is swapped in only if it passes the checks itself.
+    Levels the scorer does not know (not a key of VERBS) are left unrepaired.
+    The replacement prompt names the checks the failing items missed.
+    """
+    if not isinstance(items, list) or rounds <= 0 or bloom not in VERBS:
+        return items
+    from quality import failing_indices, score_batch
+    items = list(items)
+    for _ in range(rounds):
+        scored = score_batch(items, bloom, verbs)
+        failed = failing_indices(scored)
+        if not failed:
+            break
+        checks = [c for i in failed for c in scored["reasons"][i]]
+        prompt = (question_preamble(bloom, len(failed), material, verbs)
+                  + repair_note(checks) + topic_suffix(topic))
+        fresh = await anormalize_json(await arun_ollama(MODEL_BRAINSTORM, prompt, stats), stats)
+        if not isinstance(fresh, list):
+            break
+        fresh = [f for f in fresh if isinstance(f, dict) and "error" not in f]
+        if not fresh:
+            continue
+        good = [f for f, ok in zip(fresh, score_batch(fresh, bloom, verbs)["passed"]) if ok]
+        for i, item in zip(failed, good):
+            items[i] = item
+    return items
 
 
 # ------------------------
-# JSON normalization
+# JSON normalization (async)
 # ------------------------
-def normalize_json(text: str) -> Any:
+async def anormalize_json(text: str, stats: Optional[GenerationStats] = None) -> Any:
     """
     Clean and validate JSON using Phi-3 model.
     """
@@ -80,7 +435,7 @@ def normalize_json(text: str) -> Any:
     ---
     Output JSON only, no markdown, no explanation.
     """
-    normalized = run_ollama(MODEL_NORMALIZE, prompt)
+    normalized = await arun_ollama(MODEL_NORMALIZE, prompt, stats)
     try:
         return json.loads(normalized)
     except Exception:
@@ -92,9 +447,56 @@ def normalize_json(text: str) -> Any:
             return [{"error": "Invalid JSON returned"}]
 
 
+# ------------------------
+# Sync wrappers
+# ------------------------
+def brainstorm_questions(
+    topic: str,
+    bloom: str,
+    count: int = 10,
+    course_code: Optional[str] = None,
+    stats: Optional[GenerationStats] = None,
+    verbs: Optional[List[str]] = None,
+) -> List[Dict[str, Any]]:
+    """Sync wrapper around abrainstorm_questions."""
+    return _run_sync(abrainstorm_questions(topic, bloom, count, course_code, stats, verbs))
+
+
+def brainstorm_activities(
+    topic: str,
+    bloom: str,
+    count: int = 5,
+    course_code: Optional[str] = None,
+    stats: Optional[GenerationStats] = None,
+) -> List[Dict[str, Any]]:
+    """Sync wrapper around abrainstorm_activities."""
+    return _run_sync(abrainstorm_activities(topic, bloom, count, course_code, stats))
+
+
+def brainstorm_batch(
+    topics: List[str],
+    bloom: str,
+    count: int = 10,
+    course_code: Optional[str] = None,
+    kind: str = "questions",
+    stats: Optional[GenerationStats] = None,
+    material: Optional[List[str]] = None,
+    verbs: Optional[List[str]] = None,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Sync wrapper around abrainstorm_batch."""
+    return _run_sync(abrainstorm_batch(topics, bloom, count, course_code, kind, stats, material, verbs))
+
+
+def normalize_json(text: str, stats: Optional[GenerationStats] = None) -> Any:
+    """Sync wrapper around anormalize_json."""
+    return _run_sync(anormalize_json(text, stats))
+
+
 # ------------------------
 # Quick test (optional)
 # ------------------------
 if __name__ == "__main__":
-    result = brainstorm_questions("Thermofluids", "Apply", 3)
+    stats = GenerationStats()
+    result = brainstorm_batch(["Thermofluids", "Heat exchangers"], "Medium", 3, stats=stats)
     print(json.dumps(result, indent=2))
+    print(json.dumps(stats.report(), indent=2))
@@ -4,19 +4,55 @@
 #   assets/courses.csv  (code,label)  OR  assets/courses.json ([{"code":"..","label":".."}])
 
 import os
+import time
+_T0 = time.perf_counter()
+
 import base64
 import csv
 import json
-from io import StringIO, BytesIO
+import logging
+from contextlib import contextmanager
+from io import StringIO
 from pathlib import Path
 
 import streamlit as st
 
+from bloom import VERBS, bloom_from_week
+
+# =========================
+# Startup timing (ADI_STARTUP_PROFILE=1)
+# =========================
+# Heavy modules (python-docx, numpy, the generation client) are only imported
+# on first use: mark() times the sections of each script run, timed() the
+# first use of each lazy import in this process.
+PROFILE_STARTUP = os.getenv("ADI_STARTUP_PROFILE") == "1"
+_MARKS: list[tuple[str, float]] = []
+log = logging.getLogger(__name__)
+
+def mark(label: str):
+    if PROFILE_STARTUP:
+        _MARKS.append((label, time.perf_counter()))
+
+@st.cache_resource
+def _process_runs() -> dict:
+    return {"count": 0, "first_use": {}}
+
+@contextmanager
+def timed(label: str):
+    """Record how long the first `label` block in this process took."""
+    t = time.perf_counter()
+    try:
+        yield
+    finally:
+        if PROFILE_STARTUP:
+            _process_runs()["first_use"].setdefault(label, round((time.perf_counter() - t) * 1000, 1))
+
 # =========================
 # Robust assets directory
 # =========================
 BASE_DIR = Path(__file__).resolve().parent
 
+@st.cache_resource
 def resolve_assets_dir() -> Path:
     # 1) Env var wins if valid
     env = os.getenv("ASSETS_DIR")
@@ -56,7 +92,9 @@ HIDE_BROWSE_BUTTON = False
 # Set True to show the yellow “default courses” tip when only fallback is used
 SHOW_YELLOW_TIP = False
 
-st.markdown(f"""
+@st.cache_data
+def theme_css() -> str:
+    return f"""
 <style>
   .block-container {{ max-width: 980px; margin: 0 auto; padding-top: .6rem; }}
 
@@ -142,7 +180,9 @@ st.markdown(f"""
     padding:.5rem .75rem; border-radius:8px; color:#713f12; margin:.6rem 0 0 0;
   }}
 </style>
-""", unsafe_allow_html=True)
+"""
+
+st.markdown(theme_css(), unsafe_allow_html=True)
 
 if HIDE_BROWSE_BUTTON:
     st.markdown("""
@@ -157,9 +197,14 @@ if HIDE_BROWSE_BUTTON:
 def b64_bytes(b: bytes) -> str:
     return base64.b64encode(b).decode("utf-8")
 
+@st.cache_data(show_spinner=False)
+def _b64_file_cached(path: str, mtime: float) -> str:
+    return b64_bytes(Path(path).read_bytes())
+
 def b64_file(path: Path) -> str | None:
+    # Keyed on mtime so an edited asset is re-read, an unchanged one never is
     try:
-        return b64_bytes(path.read_bytes())
+        return _b64_file_cached(str(path), path.stat().st_mtime)
     except Exception:
         return None
 
@@ -191,6 +236,7 @@ FULL_COURSES_LIST = [
     ("CT5-CPT","Chemical Process Technology"),
 ]
 
+@st.cache_data
 def make_courses_template() -> bytes:
     s = StringIO(); w = csv.writer(s)
     w.writerow(["code","label"])
@@ -221,6 +267,11 @@ def init_state():
     ss.setdefault("logo_warning", "")
     ss.setdefault("courses_uploaded", False)
     ss.setdefault("courses_file_info", {})
+    ss.setdefault("material_info", {})
+    ss.setdefault("material_error", "")
+    ss.setdefault("gen_job", None)
+    ss.setdefault("gen_job_count", 0)
+    ss.setdefault("gen_last_spec", None)
 init_state()
 
 # =========================
@@ -282,6 +333,7 @@ def render_topbar(logo_b64: str | None):
     )
 
 render_topbar(resolve_logo_b64())
+mark("first paint (banner)")
 
 # =========================
 # Inline logo prompt (only if no logo yet)
@@ -408,13 +460,34 @@ INSTRUCTORS = [
     "Michail","Meshari","Mohammed Alwuthaylah","Myra","Meshal","Ibrahim","Khalil","Salem",
     "Rana","Daniel","Ahmed Albader"
 ]
-VERBS = {
-    "Low":    ["define","identify","list","recall","describe","classify","match"],
-    "Medium": ["apply","solve","calculate","compare","analyze","demonstrate","explain"],
-    "High":   ["evaluate","synthesize","design","justify","critique","optimize","create"]
-}
-def bloom_from_week(week: int) -> str:
-    return "Low" if week <= 4 else ("Medium" if week <= 9 else "High")
+
+# =========================
+# Generation service (optional)
+# =========================
+# Set GENERATION_SERVICE_URL to run generation in generation_service.py;
+# without it, "Generate MCQs" produces placeholder items.
+GENERATION_SERVICE_URL = os.getenv("GENERATION_SERVICE_URL", "")
+GEN_POLL_S = 2.0  # Seconds between job status checks while a job runs
+gen_pending = False  # Set when a job is still running; the script reruns at the end to poll again
+
+def items_from_service(result: dict, limit: int) -> list[dict]:
+    """Flatten {topic: [mcq, ...]} from the service into preview items."""
+    items = []
+    for mcqs in result.values():
+        for m in mcqs:
+            if not isinstance(m, dict) or "question" not in m:
+                continue
+            opts = [str(o) for o in (m.get("options") or [])][:4]
+            opts += ["…"] * (4 - len(opts))
+            items.append({
+                "stem": str(m["question"]),
+                "options": [f"{l}) {o}" for l, o in zip("ABCD", opts)],
+                # Kept as returned so the quality check can flag a bad letter
+                "answer": str(m.get("answer") or "").strip(),
+                "bloom_level": m.get("bloom_level", ""),
+                "rationale": m.get("rationale", ""),
+            })
+    return items[:limit]
 
 # =========================
 # Setup Row
@@ -473,6 +546,7 @@ with r1c[4]:
     st.markdown(f"<span class='pill pill-green'>{st.session_state.instructor}</span>", unsafe_allow_html=True)
 
 st.markdown("</div>", unsafe_allow_html=True)
+mark("setup row")
 
 # =========================
 # Authoring
@@ -515,6 +589,36 @@ if st.session_state.mode != "Print Summary":
     st.text_area("Topics (one per line)", key="topics_text", height=110,
                  placeholder="e.g.\n- Welding safety checks\n- NDT techniques (PT, MT, UT)\n- Inspection documentation flow")
 
+    # Course material → local retrieval index (per course code)
+    def index_material():
+        # Runs only when the upload set changes, into the course selected at that moment
+        files = st.session_state.material_upl or []
+        st.session_state.material_error = ""
+        if not files:
+            return
+        from course_index import index_uploads
+        try:
+            stats = index_uploads(st.session_state.course_code, [(f.name, f.getvalue()) for f in files])
+            st.session_state.material_info = {**stats, "course": st.session_state.course_code}
+        except Exception as e:
+            st.session_state.material_error = f"Could not index course material: {e}"
+
+    st.file_uploader(
+        "Course material (DOCX, PPTX, TXT) — used to ground generated questions",
+        type=["docx", "pptx", "txt"], accept_multiple_files=True, key="material_upl",
+        on_change=index_material
+    )
+    if st.session_state.material_error:
+        st.error(st.session_state.material_error)
+    if st.session_state.get("material_info"):
+        info = st.session_state.material_info
+        st.markdown(
+            f"<div class='upload-note'>Indexed for <strong>{info['course']}</strong>: "
+            f"{info['added']} new/changed, {info['unchanged']} unchanged file(s) — "
+            f"{info['chunks']} chunk(s) available.</div>",
+            unsafe_allow_html=True,
+        )
+
     c1, c2, c3 = st.columns([1,1,2])
     with c1:
         include_key = st.checkbox("Answer key", value=True)
@@ -525,16 +629,94 @@ if st.session_state.mode != "Print Summary":
         if st.button("Generate MCQs", type="primary"):
             topics = [t.strip() for t in st.session_state.topics_text.splitlines() if t.strip()]
             topic0 = topics[0] if topics else "topic"
-            st.session_state.generated_items = [{
-                "stem": f"Sample question {i+1} on {topic0}?",
-                "options": ["A) …", "B) …", "C) …", "D) …"],
-                "answer": "A"
-            } for i in range(int(mcq_count))]
+            if GENERATION_SERVICE_URL and topics:
+                # Hand off to the generation service; the job survives UI reruns/restarts
+                with timed("generation client (ai_pipeline, course_index)"):
+                    from ai_pipeline import batch_chunk_count
+                    from course_index import retrieve_for_topics
+                    from generation_client import GenerationClient, GenerationError
+                try:
+                    # The index lives on this instance's disk, so send the retrieved text along
+                    material = retrieve_for_topics(st.session_state.course_code, topics,
+                                                   batch_chunk_count(len(topics)))
+                    spec = (tuple(topics), st.session_state.bloom_level, int(mcq_count),
+                            st.session_state.course_code, tuple(st.session_state.verbs_selected))
+                    st.session_state.gen_job = GenerationClient(GENERATION_SERVICE_URL).submit(
+                        topics, st.session_state.bloom_level,
+                        count=-(-int(mcq_count) // len(topics)),
+                        course_code=st.session_state.course_code,
+                        material=material,
+                        verbs=st.session_state.verbs_selected,
+                        # Clicking again with the same inputs means "give me new questions"
+                        fresh=spec == st.session_state.gen_last_spec,
+                    )
+                    st.session_state.gen_last_spec = spec
+                    st.session_state.gen_job_count = int(mcq_count)
+                except GenerationError as e:
+                    st.error(f"Could not start generation: {e}")
+            else:
+                st.session_state.generated_items = [{
+                    "stem": f"Sample question {i+1} on {topic0}?",
+                    "options": ["A) …", "B) …", "C) …", "D) …"],
+                    "answer": "A",
+                    "placeholder": True,  # Not scored: these fail the checks by design
+                } for i in range(int(mcq_count))]
+
+    if st.session_state.gen_job:
+        from generation_client import GenerationClient, GenerationError
+        client = GenerationClient(GENERATION_SERVICE_URL)
+        try:
+            # One quick status check per run; the rest of the page is not held up
+            job = client.status(st.session_state.gen_job)
+        except GenerationError as e:
+            job = {"status": "error", "error": str(e)}
+        if job["status"] == "done":
+            items = items_from_service(job["result"], st.session_state.gen_job_count)
+            st.session_state.gen_job = None
+            if items:
+                st.session_state.generated_items = items
+            else:
+                st.error("Generation finished but returned no usable questions — try again or adjust the topics.")
+        elif job["status"] in ("error", "cancelled"):
+            st.error(f"Generation failed: {job.get('error') or job['status']}")
+            st.session_state.gen_job = None
+        else:
+            g1, g2 = st.columns([3, 1])
+            with g1:
+                st.info("Generating questions… this updates automatically.")
+            with g2:
+                if st.button("Cancel", key="gen_cancel"):
+                    client.cancel(st.session_state.gen_job)
+                    st.session_state.gen_job = None
+                    st.warning("Generation cancelled.")
+                else:
+                    gen_pending = True
 
     if st.session_state.generated_items:
         st.markdown("#### Preview")
+        # Local quality checks (structure, unique options, verbs, answer spread),
+        # for generated items only
+        scored = [i for i, q in enumerate(st.session_state.generated_items) if not q.get("placeholder")]
+        passed, reasons = {}, {}
+        if scored:
+            with timed("quality checks (numpy)"):
+                from quality import score_batch
+            qc = score_batch([st.session_state.generated_items[i] for i in scored],
+                             st.session_state.bloom_level, st.session_state.verbs_selected or None)
+            passed = dict(zip(scored, qc["passed"]))
+            reasons = dict(zip(scored, qc["reasons"]))
+            spread = " · ".join(f"{k}:{v}" for k, v in qc["answer_distribution"].items())
+            st.caption(
+                f"Quality check: **{int(qc['passed'].sum())}/{len(scored)}** passed  |  "
+                f"Answer spread {spread}" + ("  ⚠️ skewed" if qc["answer_skewed"] else "")
+            )
+        else:
+            st.caption("Placeholder items — quality checks run on generated questions only.")
         for idx, q in enumerate(st.session_state.generated_items):
-            with st.expander(f"Q{idx+1}: {q['stem'][:90]}"):
+            flag = "⚠️ " if not passed.get(idx, True) else ""
+            with st.expander(f"{flag}Q{idx+1}: {q['stem'][:90]}"):
+                if reasons.get(idx):
+                    st.caption("Check: " + ", ".join(r.replace("_", " ") for r in reasons[idx]))
                 q["stem"] = st.text_input("Stem", value=q["stem"], key=f"stem-{idx}")
                 a,b = st.columns(2)
                 q["options"][0] = a.text_input("Option A", value=q["options"][0], key=f"oa-{idx}")
@@ -542,8 +724,10 @@ if st.session_state.mode != "Print Summary":
                 c,d = st.columns(2)
                 q["options"][2] = c.text_input("Option C", value=q["options"][2], key=f"oc-{idx}")
                 q["options"][3] = d.text_input("Option D", value=q["options"][3], key=f"od-{idx}")
-                q["answer"] = st.selectbox("Correct", ["A","B","C","D"],
-                                           index=["A","B","C","D"].index(q["answer"]), key=f"ans-{idx}")
+                letters = ["A","B","C","D"]
+                q["answer"] = st.selectbox("Correct", letters,
+                                           index=letters.index(q["answer"]) if q["answer"] in letters else None,
+                                           placeholder="Choose the correct option", key=f"ans-{idx}") or q["answer"]
 
         # TXT export
         txt = "\n\n".join(
@@ -557,31 +741,20 @@ if st.session_state.mode != "Print Summary":
         )
 
         # DOCX export
-        def as_docx(items) -> bytes | None:
+        # Built only when the items change (cached), not on every rerun
+        @st.cache_data(show_spinner=False, max_entries=8)
+        def as_docx(title: str, items: list, include_key: bool) -> bytes | None:
+            from export import mcqs_to_docx
             try:
-                from docx import Document
-                from docx.shared import Pt
-                doc = Document()
-                doc.add_heading(
-                    f"{st.session_state.course_code} — Lesson {st.session_state.lesson} (Week {st.session_state.week})",
-                    level=1
-                )
-                doc.add_paragraph()
-                for i, q in enumerate(items, start=1):
-                    doc.add_paragraph(f"Q{i}. {q['stem']}")
-                    for opt in q["options"]:
-                        doc.add_paragraph(opt)
-                    if include_key:
-                        p = doc.add_paragraph(f"Answer: {q['answer']}")
-                        p.runs[0].font.bold = True
-                    doc.add_paragraph()
-                doc.styles["Normal"].font.name = "Calibri"
-                doc.styles["Normal"].font.size = Pt(11)
-                buf = BytesIO(); doc.save(buf); return buf.getvalue()
+                with timed("first .docx export (python-docx)"):
+                    return mcqs_to_docx(title, items, include_key)
             except Exception:
                 return None
 
-        docx_bytes = as_docx(st.session_state.generated_items)
+        docx_bytes = as_docx(
+            f"{st.session_state.course_code} — Lesson {st.session_state.lesson} (Week {st.session_state.week})",
+            st.session_state.generated_items, include_key
+        )
         if docx_bytes:
             st.download_button(
                 "Export (Word .docx)", data=docx_bytes,
@@ -613,3 +786,31 @@ else:
     )
 
 st.markdown("</div>", unsafe_allow_html=True)
+mark("script end")
+
+# =========================
+# Startup timing report
+# =========================
+if PROFILE_STARTUP:
+    runs = _process_runs()
+    runs["count"] += 1
+    rows, prev = [], _T0
+    for label, t in _MARKS:
+        rows.append({"stage": label, "ms": round((t - prev) * 1000, 1),
+                     "cumulative ms": round((t - _T0) * 1000, 1)})
+        prev = t
+    first_use = [{"import": k, "ms": v} for k, v in runs["first_use"].items()]
+    with st.sidebar.expander("Startup timing", expanded=True):
+        st.caption(f"Script run #{runs['count']} in this process")
+        st.table(rows)
+        if first_use:
+            st.caption("Lazy imports (first use in this process)")
+            st.table(first_use)
+    if not logging.getLogger().handlers:
+        logging.basicConfig(level=logging.INFO)
+    log.info("ADI startup timing: %s lazy imports: %s", json.dumps(rows), json.dumps(runs["first_use"]))
+
+# Poll a running generation job again shortly (a click reruns the script sooner)
+if gen_pending:
+    time.sleep(GEN_POLL_S)
+    st.rerun()
@@ -0,0 +1,9 @@
+# bloom.py — Bloom's taxonomy levels and verbs shared by the UI and the AI pipeline.
+
+VERBS = {
+    "Low":    ["define","identify","list","recall","describe","classify","match"],
+    "Medium": ["apply","solve","calculate","compare","analyze","demonstrate","explain"],
+    "High":   ["evaluate","synthesize","design","justify","critique","optimize","create"]
+}
+def bloom_from_week(week: int) -> str:
+    return "Low" if week <= 4 else ("Medium" if week <= 9 else "High")
@@ -0,0 +1,241 @@
+# course_index.py
+# ------------------------------------------------------------
+# Local retrieval index over uploaded course material.
+# Documents (DOCX, PPTX, TXT) are chunked and indexed per
+# course code with BM25. Works entirely offline; the index is
+# persisted as JSON and updated incrementally on re-upload.
+# ------------------------------------------------------------
+
+from __future__ import annotations
+import hashlib, json, math, os, re
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# ------------------------
+# Configuration
+# ------------------------
+INDEX_DIR = Path(os.getenv("ADI_INDEX_DIR", ".adi_index"))
+CHUNK_WORDS = int(os.getenv("ADI_CHUNK_WORDS", "160"))     # Words per chunk
+CHUNK_OVERLAP = int(os.getenv("ADI_CHUNK_OVERLAP", "40"))  # Words shared by neighbouring chunks
+SUPPORTED_EXT = {"docx", "pptx", "txt"}
+
+# BM25 parameters (standard defaults)
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "into", "is", "it",
+    "its", "of", "on", "or", "that", "the", "this", "to", "was", "were", "with",
+}
+
+
+# ------------------------
+# Text extraction & chunking
+# ------------------------
+def extract_text(name: str, data: bytes) -> str:
+    """Return plain text from a DOCX, PPTX or TXT upload."""
+    ext = Path(name).suffix.lower().lstrip(".")
+    if ext == "txt":
+        return data.decode("utf-8", errors="ignore")
+    if ext == "docx":
+        from docx import Document
+        doc = Document(BytesIO(data))
+        parts = [p.text for p in doc.paragraphs]
+        for table in doc.tables:
+            for row in table.rows:
+                parts.append(" | ".join(cell.text for cell in row.cells))
+        return "\n".join(p for p in parts if p.strip())
+    if ext == "pptx":
+        from pptx import Presentation
+        prs = Presentation(BytesIO(data))
+        parts = []
+        for slide in prs.slides:
+            for shape in slide.shapes:
+                if getattr(shape, "has_text_frame", False) and shape.text_frame.text.strip():
+                    parts.append(shape.text_frame.text)
+            if slide.has_notes_slide and slide.notes_slide.notes_text_frame.text.strip():
+                parts.append(slide.notes_slide.notes_text_frame.text)
+        return "\n".join(parts)
+    raise ValueError(f"Unsupported file type: .{ext}")
+
+
+def chunk_text(text: str, size: int = CHUNK_WORDS, overlap: int = CHUNK_OVERLAP) -> List[str]:
+    """Split text into overlapping windows of roughly `size` words."""
+    words = text.split()
+    if not words:
+        return []
+    step = max(1, size - overlap)
+    chunks = []
+    for start in range(0, len(words), step):
+        chunks.append(" ".join(words[start : start + size]))
+        if start + size >= len(words):
+            break
+    return chunks
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def _safe_name(course_code: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", course_code.strip()) or "default"
+
+
+# ------------------------
+# Per-course BM25 index
+# ------------------------
+class CourseIndex:
+    """
+    BM25 index of course material for one course code.
+
+    Each document is stored with its SHA-1 so re-uploading an unchanged
+    file is a no-op; a changed file replaces only its own chunks.
+    """
+
+    def __init__(self, course_code: str, root: Path = INDEX_DIR):
+        self.course_code = course_code
+        self.path = Path(root) / f"{_safe_name(course_code)}.json"
+        self.docs: Dict[str, str] = {}            # source name -> sha1
+        self.chunks: List[Dict[str, Any]] = []    # {"source", "text", "tf", "len"}
+        self.df: Dict[str, int] = {}
+        self.load()
+
+    # Persistence
+    def load(self) -> None:
+        if not self.path.exists():
+            return
+        try:
+            raw = json.loads(self.path.read_text(encoding="utf-8"))
+        except Exception:
+            return
+        self.docs = raw.get("docs", {})
+        self.chunks = raw.get("chunks", [])
+        self._rebuild_df()
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"docs": self.docs, "chunks": self.chunks}), encoding="utf-8")
+        tmp.replace(self.path)
+
+    def _rebuild_df(self) -> None:
+        df: Dict[str, int] = {}
+        for c in self.chunks:
+            for term in c["tf"]:
+                df[term] = df.get(term, 0) + 1
+        self.df = df
+
+    # Updates
+    def add_document(self, name: str, data: bytes) -> bool:
+        """Index (or re-index) a document. Returns False if it was unchanged."""
+        digest = hashlib.sha1(data).hexdigest()
+        if self.docs.get(name) == digest:
+            return False
+        self._drop_chunks(name)
+        for text in chunk_text(extract_text(name, data)):
+            tf: Dict[str, int] = {}
+            terms = tokenize(text)
+            for term in terms:
+                tf[term] = tf.get(term, 0) + 1
+            self.chunks.append({"source": name, "text": text, "tf": tf, "len": len(terms)})
+            for term in tf:
+                self.df[term] = self.df.get(term, 0) + 1
+        self.docs[name] = digest
+        return True
+
+    def remove_document(self, name: str) -> None:
+        self._drop_chunks(name)
+        self.docs.pop(name, None)
+
+    def _drop_chunks(self, name: str) -> None:
+        kept = []
+        for c in self.chunks:
+            if c["source"] != name:
+                kept.append(c)
+                continue
+            for term in c["tf"]:
+                self.df[term] -= 1
+                if self.df[term] <= 0:
+                    del self.df[term]
+        self.chunks = kept
+
+    # Retrieval
+    def search(self, query: str, k: int = 4) -> List[Dict[str, Any]]:
+        """Return the top-k chunks for `query` as {"source", "text", "score"}."""
+        terms = set(tokenize(query))
+        n = len(self.chunks)
+        if not terms or not n:
+            return []
+        avg_len = sum(c["len"] for c in self.chunks) / n or 1.0
+        idf = {
+            t: math.log(1 + (n - self.df[t] + 0.5) / (self.df[t] + 0.5))
+            for t in terms if t in self.df
+        }
+        if not idf:
+            return []
+        scored = []
+        for c in self.chunks:
+            tf = c["tf"]
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * c["len"] / avg_len)
+            score = 0.0
+            for t, w in idf.items():
+                f = tf.get(t)
+                if f:
+                    score += w * f * (BM25_K1 + 1) / (f + norm)
+            if score > 0:
+                scored.append((score, c))
+        scored.sort(key=lambda x: x[0], reverse=True)
+        return [{"source": c["source"], "text": c["text"], "score": round(s, 4)} for s, c in scored[:k]]
+
+
+# ------------------------
+# Convenience helpers
+# ------------------------
+def index_uploads(course_code: str, files: List[tuple[str, bytes]], root: Path = INDEX_DIR) -> Dict[str, int]:
+    """
+    Add (name, bytes) uploads to the course index and persist it.
+    Returns counts of added/unchanged/skipped files and total chunks.
+    """
+    idx = CourseIndex(course_code, root)
+    added = unchanged = skipped = 0
+    for name, data in files:
+        if Path(name).suffix.lower().lstrip(".") not in SUPPORTED_EXT:
+            skipped += 1
+            continue
+        if idx.add_document(name, data):
+            added += 1
+        else:
+            unchanged += 1
+    if added:
+        idx.save()
+    return {"added": added, "unchanged": unchanged, "skipped": skipped, "chunks": len(idx.chunks)}
+
+
+def retrieve_context(course_code: Optional[str], query: str, k: int = 4, root: Path = INDEX_DIR) -> List[str]:
+    """Top-k chunk texts for `query` from the course index (empty if none)."""
+    if not course_code:
+        return []
+    return [hit["text"] for hit in CourseIndex(course_code, root).search(query, k)]
+
+
+def retrieve_for_topics(course_code: Optional[str], topics: List[str], k: int = 4,
+                        root: Path = INDEX_DIR) -> List[str]:
+    """
+    Up to k chunk texts for several topics: each topic is searched on its
+    own and the hits are interleaved (best of each topic first, duplicates
+    dropped), so one topic's vocabulary cannot crowd out the others.
+    """
+    if not course_code or not topics:
+        return []
+    idx = CourseIndex(course_code, root)
+    ranked = [[hit["text"] for hit in idx.search(t, k)] for t in topics]
+    merged: List[str] = []
+    for rank in range(k):
+        for hits in ranked:
+            if rank < len(hits) and hits[rank] not in merged:
+                merged.append(hits[rank])
+                if len(merged) == k:
+                    return merged
+    return merged
@@ -1,7 +1,9 @@
-from docx import Document
-from datetime import datetime
+# python-docx is imported inside each exporter so it only loads when an export runs.
+from io import BytesIO
+
 
 def export_to_word(course_info, verbs):
+    from docx import Document
     doc = Document()
     doc.add_heading("ADI Builder Output", 0)
     doc.add_paragraph(f"Course: {course_info['course']}")
@@ -12,3 +14,26 @@ def export_to_word(course_info, verbs):
         doc.add_paragraph(f"- {verb}")
     filename = f"ADI_Output_{course_info['course'].replace(' ', '_')}.docx"
     doc.save(filename)
+
+
+def mcqs_to_docx(title, items, include_key=True):
+    """Return MCQs as .docx bytes, or None if python-docx is unavailable."""
+    try:
+        from docx import Document
+        from docx.shared import Pt
+    except ImportError:
+        return None
+    doc = Document()
+    doc.add_heading(title, level=1)
+    doc.add_paragraph()
+    for i, q in enumerate(items, start=1):
+        doc.add_paragraph(f"Q{i}. {q['stem']}")
+        for opt in q["options"]:
+            doc.add_paragraph(opt)
+        if include_key:
+            p = doc.add_paragraph(f"Answer: {q['answer']}")
+            p.runs[0].font.bold = True
+        doc.add_paragraph()
+    doc.styles["Normal"].font.name = "Calibri"
+    doc.styles["Normal"].font.size = Pt(11)
+    buf = BytesIO(); doc.save(buf); return buf.getvalue()
@@ -0,0 +1,82 @@
+# generation_client.py
+# ------------------------------------------------------------
+# Thin stdlib client for generation_service.py, used by app.py.
+# ------------------------------------------------------------
+
+from __future__ import annotations
+import json, os, time
+from typing import Any, Dict, List, Optional
+from urllib import error, request
+
+GENERATION_SERVICE_URL = os.getenv("GENERATION_SERVICE_URL", "")
+GENERATION_SERVICE_TOKEN = os.getenv("GENERATION_SERVICE_TOKEN", "")
+
+
+class GenerationError(RuntimeError):
+    pass
+
+
+class GenerationClient:
+    """Submit generation jobs to the service and poll for their results."""
+
+    def __init__(self, base_url: str = GENERATION_SERVICE_URL, timeout: float = 10,
+                 token: str = GENERATION_SERVICE_TOKEN):
+        if base_url and "://" not in base_url:
+            base_url = f"http://{base_url}"  # Render's fromService hostport has no scheme
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.token = token
+
+    def _call(self, method: str, path: str, body: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        headers = {"Content-Type": "application/json"}
+        if self.token:
+            headers["X-ADI-Token"] = self.token
+        req = request.Request(self.base_url + path, data=data, method=method, headers=headers)
+        try:
+            with request.urlopen(req, timeout=self.timeout) as resp:
+                return json.loads(resp.read() or b"{}")
+        except error.HTTPError as e:
+            try:
+                msg = json.loads(e.read()).get("error", e.reason)
+            except Exception:
+                msg = e.reason
+            raise GenerationError(f"{e.code}: {msg}") from e
+        except (error.URLError, OSError) as e:
+            raise GenerationError(f"Generation service unreachable: {e}") from e
+
+    def health(self) -> Dict[str, Any]:
+        return self._call("GET", "/health")
+
+    def submit(self, topics: List[str], bloom: str, count: int = 10,
+               course_code: Optional[str] = None, kind: str = "questions",
+               material: Optional[List[str]] = None, verbs: Optional[List[str]] = None,
+               fresh: bool = False) -> str:
+        """
+        Queue a job. `material` is course text retrieved locally for grounding;
+        `verbs` are the selected Bloom verbs the service checks MCQs against.
+        `fresh` bypasses the service's result cache.
+        """
+        spec = {"topics": topics, "bloom": bloom, "count": count, "course_code": course_code,
+                "kind": kind, "verbs": verbs or [], "fresh": fresh}
+        if material is not None:
+            spec["material"] = material
+        return self._call("POST", "/jobs", spec)["job_id"]
+
+    def status(self, job_id: str) -> Dict[str, Any]:
+        return self._call("GET", f"/jobs/{job_id}")
+
+    def cancel(self, job_id: str) -> bool:
+        try:
+            return bool(self._call("DELETE", f"/jobs/{job_id}").get("cancelled"))
+        except GenerationError:
+            return False
+
+    def wait(self, job_id: str, timeout: float = 600, poll: float = 1.0) -> Dict[str, Any]:
+        """Poll until the job leaves queued/running or `timeout` seconds pass."""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.status(job_id)
+            if job["status"] not in ("queued", "running") or time.monotonic() >= deadline:
+                return job
+            time.sleep(poll)
@@ -0,0 +1,358 @@
+# generation_service.py
+# ------------------------------------------------------------
+# Standalone generation server for ADI Builder. Exposes the
+# ai_pipeline functions over a small JSON HTTP API (stdlib only)
+# so the Streamlit UI and the model client scale independently.
+#
+#   python generation_service.py            # listens on $PORT or 8502
+#
+# If GENERATION_SERVICE_TOKEN is set, every call except /health must send
+# it in the X-ADI-Token header. Without a token the server only binds to
+# localhost.
+#
+#   GET    /health          -> {"ok": true, "queued": n, "jobs": n}
+#   POST   /jobs            -> 202 {"job_id": "..."}   ("fresh": true skips the cache)
+#   GET    /jobs/<id>       -> {"status": ..., "result": {...}, ...}
+#   DELETE /jobs/<id>       -> cancel a queued/running job
+# ------------------------------------------------------------
+
+from __future__ import annotations
+import asyncio, hashlib, hmac, json, os, threading, time, uuid
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+import ai_pipeline
+from bloom import VERBS
+
+# ------------------------
+# Configuration
+# ------------------------
+HOST = os.getenv("GENERATION_HOST", "127.0.0.1")
+TOKEN = os.getenv("GENERATION_SERVICE_TOKEN", "")                     # Shared secret with the UI
+PORT = int(os.getenv("PORT", os.getenv("GENERATION_PORT", "8502")))
+BATCH_WINDOW_S = float(os.getenv("GENERATION_BATCH_WINDOW", "0.05"))  # Wait to collect jobs into one batch
+CACHE_SIZE = int(os.getenv("GENERATION_CACHE_SIZE", "256"))           # Cached (topic, params) results
+JOB_TTL_S = int(os.getenv("GENERATION_JOB_TTL", "3600"))              # Keep finished jobs this long
+MAX_MATERIAL_CHARS = 200_000  # Upper bound on course material sent with one job
+KINDS = {"questions", "activities"}
+
+# (kind, bloom, count, course_code, material digest, verbs) — jobs with equal keys share one batch
+BatchKey = Tuple[str, str, int, str, str, Tuple[str, ...]]
+
+
+# ------------------------
+# Job store, cache and queue
+# ------------------------
+class GenerationService:
+    """
+    Owns an asyncio loop in a background thread. HTTP handler threads
+    submit jobs; a dispatcher groups queued jobs with the same parameters
+    into one ai_pipeline.abrainstorm_batch call, so they share a prompt
+    prefix. Per-topic results that are usable (no error items, and MCQs
+    that pass the quality checks) are cached, so repeat requests (e.g.
+    after a UI restart) return immediately.
+    """
+
+    def __init__(self) -> None:
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self.cache: "OrderedDict[Tuple[BatchKey, str], List[Dict[str, Any]]]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.loop = asyncio.new_event_loop()
+        self.queue: Optional[asyncio.Queue] = None
+        self.tasks: Dict[str, asyncio.Task] = {}  # job_id -> running batch task
+        self.thread = threading.Thread(target=self._run_loop, name="generation-loop", daemon=True)
+        self.started = threading.Event()
+
+    # Lifecycle
+    def start(self) -> None:
+        self.thread.start()
+        self.started.wait()
+
+    def _run_loop(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.queue = asyncio.Queue()
+        self.loop.create_task(self._dispatch())
+        self.started.set()
+        self.loop.run_forever()
+
+    def stop(self) -> None:
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result(timeout=5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5)
+        self.loop.close()
+
+    async def _shutdown(self) -> None:
+        # Stop the dispatcher and any running batches before the loop goes away
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await ai_pipeline.aclose_client()
+
+    # Public API (called from HTTP threads)
+    def submit(self, spec: Dict[str, Any]) -> str:
+        """Queue a job for a parsed request body; raises ValueError/TypeError if invalid."""
+        key, topics, material = _parse_spec(spec)
+        fresh = bool(spec.get("fresh"))
+        job_id = uuid.uuid4().hex
+        job = {
+            "status": "queued", "key": key, "topics": topics, "material": material,
+            "result": {}, "error": None, "stats": None, "created": time.time(),
+        }
+        with self.lock:
+            self._prune()
+            self.jobs[job_id] = job
+            cached = {} if fresh else {t: self.cache[(key, t)] for t in topics if (key, t) in self.cache}
+            for t in cached:
+                self.cache.move_to_end((key, t))
+            if len(cached) == len(topics):
+                job.update(status="done", result=cached, finished=time.time())
+                return job_id
+            job["result"] = cached
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, job_id)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            return {k: job[k] for k in ("status", "topics", "result", "error", "stats")}
+
+    def cancel(self, job_id: str) -> bool:
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job["status"] in ("done", "error", "cancelled"):
+                return False
+            job.update(status="cancelled", finished=time.time())
+            task = self.tasks.get(job_id)
+        if task is not None:
+            self.loop.call_soon_threadsafe(self._cancel_if_orphaned, task)
+        return True
+
+    def queued(self) -> int:
+        return self.queue.qsize() if self.queue is not None else 0
+
+    # Internals (run on the loop thread)
+    async def _dispatch(self) -> None:
+        while True:
+            first = await self.queue.get()
+            await asyncio.sleep(BATCH_WINDOW_S)
+            job_ids = [first]
+            while not self.queue.empty():
+                job_ids.append(self.queue.get_nowait())
+            groups: Dict[BatchKey, List[str]] = {}
+            # Mark running and register the task in one critical section, so a
+            # cancel() never sees a running job without a task to cancel.
+            with self.lock:
+                for jid in job_ids:
+                    job = self.jobs.get(jid)
+                    if job is not None and job["status"] == "queued":
+                        job["status"] = "running"
+                        groups.setdefault(job["key"], []).append(jid)
+                for key, jids in groups.items():
+                    task = asyncio.create_task(self._run_batch(key, jids))
+                    for jid in jids:
+                        self.tasks[jid] = task
+
+    async def _run_batch(self, key: BatchKey, job_ids: List[str]) -> None:
+        kind, bloom, count, course_code, _, verbs = key
+        with self.lock:
+            topics: List[str] = []
+            material = None
+            for jid in job_ids:
+                job = self.jobs.get(jid)
+                if job is None or job["status"] != "running":
+                    continue
+                material = job["material"]
+                topics.extend(t for t in job["topics"] if t not in job["result"] and t not in topics)
+            if not topics:
+                for jid in job_ids:
+                    self.tasks.pop(jid, None)
+                return
+        stats = ai_pipeline.GenerationStats()
+        try:
+            result = await ai_pipeline.abrainstorm_batch(
+                topics, bloom, count, course_code or None, kind, stats, material, list(verbs) or None
+            )
+        except asyncio.CancelledError:
+            self._finish(job_ids, error="cancelled")
+            return
+        except Exception as e:
+            self._finish(job_ids, error=str(e))
+            return
+        with self.lock:
+            for topic, items in result.items():
+                if not _cacheable(key, items):
+                    continue
+                self.cache[(key, topic)] = items
+                self.cache.move_to_end((key, topic))
+            while len(self.cache) > CACHE_SIZE:
+                self.cache.popitem(last=False)
+        self._finish(job_ids, result=result, stats=stats.report())
+
+    def _finish(self, job_ids: List[str], result: Optional[Dict[str, Any]] = None,
+                error: Optional[str] = None, stats: Optional[Dict[str, Any]] = None) -> None:
+        with self.lock:
+            for jid in job_ids:
+                self.tasks.pop(jid, None)
+                job = self.jobs.get(jid)
+                if job is None or job["status"] == "cancelled":
+                    continue
+                job["finished"] = time.time()
+                if error is not None:
+                    job.update(status="error", error=error)
+                else:
+                    job["result"].update({t: result[t] for t in job["topics"] if t in result})
+                    job.update(status="done", stats=stats)
+
+    def _cancel_if_orphaned(self, task: asyncio.Task) -> None:
+        # A batch may serve several jobs; only cancel it once none still want it.
+        with self.lock:
+            live = [jid for jid, t in self.tasks.items()
+                    if t is task and jid in self.jobs and self.jobs[jid]["status"] == "running"]
+        if not live:
+            task.cancel()
+
+    def _prune(self) -> None:
+        cutoff = time.time() - JOB_TTL_S
+        for jid in [j for j, job in self.jobs.items() if job.get("finished", time.time()) < cutoff]:
+            del self.jobs[jid]
+
+
+def _parse_spec(spec: Dict[str, Any]) -> Tuple[BatchKey, List[str], Optional[List[str]]]:
+    if not isinstance(spec, dict):
+        raise ValueError("request body must be a JSON object")
+    kind = spec.get("kind", "questions")
+    if kind not in KINDS:
+        raise ValueError(f"kind must be one of {sorted(KINDS)}")
+    topics = spec.get("topics")
+    if not isinstance(topics, list):
+        raise ValueError("topics must be a non-empty list")
+    topics = [str(t).strip() for t in topics if str(t).strip()]
+    if not topics:
+        raise ValueError("topics must be a non-empty list")
+    bloom = str(spec.get("bloom") or "").strip()
+    if bloom not in VERBS:
+        raise ValueError(f"bloom must be one of {list(VERBS)}")
+    verbs = spec.get("verbs") or []
+    if not isinstance(verbs, list) or not set(verbs) <= set(VERBS[bloom]):
+        raise ValueError(f"verbs must be a subset of {VERBS[bloom]}")
+    count = int(spec.get("count", 10))
+    if not 1 <= count <= 50:
+        raise ValueError("count must be between 1 and 50")
+    course_code = str(spec.get("course_code") or "")
+    # Material retrieved by the UI from its own index; the service may run
+    # on another host and cannot see that index.
+    material = spec.get("material")
+    if material is not None:
+        if not isinstance(material, list) or not all(isinstance(m, str) for m in material):
+            raise ValueError("material must be a list of strings")
+        if sum(len(m) for m in material) > MAX_MATERIAL_CHARS:
+            raise ValueError(f"material exceeds {MAX_MATERIAL_CHARS} characters")
+    digest = hashlib.sha1(json.dumps(material).encode("utf-8")).hexdigest() if material is not None else ""
+    key = (kind, bloom, count, course_code, digest, tuple(sorted(set(verbs))))
+    return key, list(dict.fromkeys(topics)), material
+
+
+def _cacheable(key: BatchKey, items: Any) -> bool:
+    """Only cache results worth returning again: no error items, MCQs that pass."""
+    kind, bloom, _, _, _, verbs = key
+    if not isinstance(items, list) or not items:
+        return False
+    if any(not isinstance(it, dict) or "error" in it for it in items):
+        return False
+    if kind == "questions":
+        from quality import score_batch
+        return bool(score_batch(items, bloom, list(verbs) or None)["passed"].all())
+    return True
+
+
+# ------------------------
+# HTTP handler
+# ------------------------
+class Handler(BaseHTTPRequestHandler):
+    service: GenerationService  # set in serve()
+
+    def _send(self, code: int, body: Dict[str, Any]) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _authorized(self) -> bool:
+        if not TOKEN:
+            return True
+        if hmac.compare_digest(self.headers.get("X-ADI-Token", ""), TOKEN):
+            return True
+        self._send(401, {"error": "unauthorized"})
+        return False
+
+    def _job_id(self) -> Optional[str]:
+        parts = self.path.strip("/").split("/")
+        return parts[1] if len(parts) == 2 and parts[0] == "jobs" else None
+
+    def do_GET(self) -> None:
+        if self.path.rstrip("/") == "/health":
+            self._send(200, {"ok": True, "queued": self.service.queued(), "jobs": len(self.service.jobs)})
+            return
+        if not self._authorized():
+            return
+        job_id = self._job_id()
+        job = self.service.get(job_id) if job_id else None
+        if job is None:
+            self._send(404, {"error": "not found"})
+        else:
+            self._send(200, job)
+
+    def do_POST(self) -> None:
+        if not self._authorized():
+            return
+        if self.path.rstrip("/") != "/jobs":
+            self._send(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            spec = json.loads(self.rfile.read(length) or b"{}")
+            job_id = self.service.submit(spec)
+        except (ValueError, TypeError) as e:
+            self._send(400, {"error": str(e)})
+            return
+        self._send(202, {"job_id": job_id})
+
+    def do_DELETE(self) -> None:
+        if not self._authorized():
+            return
+        job_id = self._job_id()
+        if job_id and self.service.cancel(job_id):
+            self._send(200, {"cancelled": True})
+        else:
+            self._send(404, {"error": "not found or already finished"})
+
+    def log_message(self, fmt: str, *args: Any) -> None:
+        if os.getenv("GENERATION_ACCESS_LOG"):
+            super().log_message(fmt, *args)
+
+
+def serve(host: str = HOST, port: int = PORT) -> None:
+    if not TOKEN and host not in ("127.0.0.1", "localhost", "::1"):
+        raise SystemExit(f"Refusing to listen on {host} without GENERATION_SERVICE_TOKEN set")
+    service = GenerationService()
+    service.start()
+    Handler.service = service
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f"ADI generation service listening on {host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.stop()
+
+
+if __name__ == "__main__":
+    serve()
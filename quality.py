@@ -0,0 +1,151 @@
+# quality.py
+# ------------------------------------------------------------
+# Cheap local quality checks for generated MCQs. Scores whole
+# batches with NumPy so only failing items need another model
+# call. Accepts both pipeline items (question/options/answer)
+# and preview items (stem/"A) ..." options/answer).
+# ------------------------------------------------------------
+
+from __future__ import annotations
+import re
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from bloom import VERBS
+
+# ------------------------
+# Configuration
+# ------------------------
+LETTERS = ("A", "B", "C", "D")
+LENGTH_RATIO_MAX = 3.0      # Longest option may be at most this × the shortest
+ANSWER_LONGEST_RATIO = 1.6  # Correct option this much longer than distractors is a giveaway
+ANSWER_SKEW_SHARE = 0.5     # One letter holding more than this share of a batch is skewed
+
+# Score weights per check; an item passes only if every check passes.
+WEIGHTS = {
+    "structure": 0.30,
+    "answer_letter": 0.20,
+    "unique_options": 0.20,
+    "bloom_level": 0.10,
+    "verb_aligned": 0.10,
+    "length_balanced": 0.05,
+    "answer_not_longest": 0.05,
+}
+
+_LABEL_RE = re.compile(r"^\s*[A-Da-d]\s*[).:-]\s*")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def _strip_label(option: str) -> str:
+    return _LABEL_RE.sub("", option)
+
+
+def _norm_option(option: str) -> str:
+    # Case, spacing and trailing sentence punctuation only: signs, decimals
+    # and units ("-5 °C", "1.5") must stay distinct
+    return _SPACE_RE.sub(" ", option.lower()).strip().rstrip(".,;:!?").strip()
+
+
+def verb_forms(verb: str) -> List[str]:
+    """
+    Whole-word inflections of a verb: base, -s, -ed, -ing, plus the British
+    -ise spelling of -ize verbs ("analyze" -> analyse, analysing, ...).
+    """
+    v = verb.lower()
+    if v.endswith("y") and v[-2:-1] not in "aeiou":
+        forms = [v, v[:-1] + "ies", v[:-1] + "ied", v + "ing"]
+    elif v.endswith("e"):
+        forms = [v, v + "s", v + "d", v[:-1] + "ing"]
+    elif v.endswith(("s", "sh", "ch", "x", "z")):
+        forms = [v, v + "es", v + "ed", v + "ing"]
+    else:
+        forms = [v, v + "s", v + "ed", v + "ing"]
+    if v.endswith(("ize", "yze")):
+        forms += [f.replace("z", "s") for f in forms]
+    return forms
+
+
+def _verb_pattern(verbs: Sequence[str]) -> re.Pattern:
+    forms = sorted({re.escape(f) for v in verbs for f in verb_forms(v)}, key=len, reverse=True)
+    return re.compile(r"\b(?:" + "|".join(forms) + r")\b", re.IGNORECASE)
+
+
+# ------------------------
+# Batch scoring
+# ------------------------
+def score_batch(
+    items: List[Dict[str, Any]], bloom_level: str, verbs: Optional[Sequence[str]] = None
+) -> Dict[str, Any]:
+    """
+    Score a batch of MCQs against `bloom_level`.
+
+    Each check is computed as a boolean array over the batch. `verbs`
+    defaults to VERBS[bloom_level] (pass the selected verbs to narrow it).
+    Returns per-item `scores`, `passed` and `reasons`, plus the batch's
+    `answer_distribution` and whether it is `answer_skewed`. Raises
+    ValueError for a level that is not a key of VERBS.
+    """
+    if bloom_level not in VERBS:
+        raise ValueError(f"Unknown Bloom level {bloom_level!r}; expected one of {list(VERBS)}")
+    n = len(items)
+    stems = [str(it.get("stem") or it.get("question") or "") if isinstance(it, dict) else "" for it in items]
+    raw_opts = [it.get("options") if isinstance(it, dict) else None for it in items]
+    has_four = np.array([isinstance(o, list) and len(o) == 4 for o in raw_opts], dtype=bool)
+    opts = [[_strip_label(str(x)).strip() for x in o] if ok else ["", "", "", ""]
+            for o, ok in zip(raw_opts, has_four)]
+
+    lengths = np.array([[len(x) for x in o] for o in opts], dtype=float).reshape(n, 4)
+    norm_ids = np.array([[hash(_norm_option(x)) for x in o] for o in opts],
+                        dtype=np.int64).reshape(n, 4)
+
+    checks: Dict[str, np.ndarray] = {}
+    has_stem = np.array([bool(s.strip()) for s in stems], dtype=bool)
+    checks["structure"] = has_four & has_stem & (lengths.min(axis=1) > 0)
+
+    answers = [str(it.get("answer") or "").strip().upper()[:2].rstrip(").") if isinstance(it, dict) else ""
+               for it in items]
+    answer_idx = np.array([LETTERS.index(a) if a in LETTERS else -1 for a in answers], dtype=int)
+    checks["answer_letter"] = answer_idx >= 0
+
+    sorted_ids = np.sort(norm_ids, axis=1)
+    checks["unique_options"] = has_four & np.all(np.diff(sorted_ids, axis=1) != 0, axis=1)
+
+    levels = [str(it.get("bloom_level") or "").strip().lower() if isinstance(it, dict) else "" for it in items]
+    checks["bloom_level"] = np.array([lv in ("", bloom_level.lower()) for lv in levels], dtype=bool)
+
+    pattern = _verb_pattern(verbs or VERBS[bloom_level])
+    checks["verb_aligned"] = np.array([bool(pattern.search(s)) for s in stems], dtype=bool)
+
+    safe_min = np.maximum(lengths.min(axis=1), 1.0)
+    checks["length_balanced"] = checks["structure"] & (lengths.max(axis=1) / safe_min <= LENGTH_RATIO_MAX)
+
+    rows = np.arange(n)
+    ans_len = lengths[rows, np.clip(answer_idx, 0, 3)]
+    distractor_mean = (lengths.sum(axis=1) - ans_len) / 3
+    giveaway = ans_len > ANSWER_LONGEST_RATIO * np.maximum(distractor_mean, 1.0)
+    checks["answer_not_longest"] = ~(checks["answer_letter"] & giveaway)
+
+    names = list(WEIGHTS)
+    matrix = np.stack([checks[k] for k in names], axis=1) if n else np.zeros((0, len(names)), dtype=bool)
+    weights = np.array([WEIGHTS[k] for k in names])
+    scores = matrix.astype(float) @ weights
+    passed = matrix.all(axis=1)
+    reasons = [[names[j] for j in np.flatnonzero(~row)] for row in matrix]
+
+    counts = np.bincount(answer_idx[answer_idx >= 0], minlength=4) if n else np.zeros(4, dtype=int)
+    distribution = dict(zip(LETTERS, counts.tolist()))
+    skewed = bool(n >= 4 and counts.max() > ANSWER_SKEW_SHARE * n)
+
+    return {
+        "scores": scores,
+        "passed": passed,
+        "reasons": reasons,
+        "answer_distribution": distribution,
+        "answer_skewed": skewed,
+    }
+
+
+def failing_indices(report: Dict[str, Any]) -> List[int]:
+    """Indices of items that failed at least one check."""
+    return np.flatnonzero(~report["passed"]).tolist()
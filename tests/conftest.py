@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The app modules live at the repo root (no package), so make them importable.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
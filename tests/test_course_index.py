@@ -0,0 +1,135 @@
+import json
+
+import pytest
+
+from course_index import CourseIndex, chunk_text, extract_text, index_uploads, retrieve_context, retrieve_for_topics, tokenize
+
+
+def words(n, word="w"):
+    return " ".join(f"{word}{i}" for i in range(n))
+
+
+# ------------------------
+# Chunking & tokenizing
+# ------------------------
+def test_chunk_text_empty():
+    assert chunk_text("") == []
+    assert chunk_text("   \n ") == []
+
+
+def test_chunk_text_short_text_is_one_chunk():
+    assert chunk_text("one two three", size=10, overlap=2) == ["one two three"]
+
+
+def test_chunk_text_overlaps_and_covers_all_words():
+    chunks = chunk_text(words(25), size=10, overlap=3)
+    assert [len(c.split()) for c in chunks] == [10, 10, 10, 4]
+    assert chunks[0].split()[-3:] == chunks[1].split()[:3]
+    assert chunks[-1].split()[-1] == "w24"
+
+
+def test_chunk_text_overlap_not_smaller_than_size_still_terminates():
+    chunks = chunk_text(words(5), size=2, overlap=5)
+    assert chunks[-1].split()[-1] == "w4"
+
+
+def test_tokenize_lowercases_and_drops_stopwords():
+    assert tokenize("The Heat-Exchanger and a PUMP, 2x") == ["heat", "exchanger", "pump", "2x"]
+
+
+def test_extract_text_txt_and_unsupported():
+    assert extract_text("notes.TXT", "Bernoulli — flow".encode("utf-8")) == "Bernoulli — flow"
+    with pytest.raises(ValueError):
+        extract_text("slides.pdf", b"%PDF")
+
+
+# ------------------------
+# BM25 ranking
+# ------------------------
+def test_search_ranks_matching_chunk_first(tmp_path):
+    idx = CourseIndex("CT4-TFL", tmp_path)
+    idx.add_document("flow.txt", b"Bernoulli equation relates pressure and velocity in pipe flow.")
+    idx.add_document("heat.txt", b"Heat exchangers transfer thermal energy. Heat exchanger fouling reduces heat transfer.")
+    idx.add_document("misc.txt", b"Laboratory safety rules and goggles.")
+    hits = idx.search("heat exchanger", k=2)
+    assert hits[0]["source"] == "heat.txt"
+    assert len(hits) == 1  # only chunks with a matching term are returned
+    assert hits[0]["score"] > 0
+
+
+def test_search_empty_index_or_query(tmp_path):
+    idx = CourseIndex("X", tmp_path)
+    assert idx.search("anything") == []
+    idx.add_document("a.txt", b"pumps and valves")
+    assert idx.search("the and of") == []
+    assert idx.search("turbine") == []
+
+
+# ------------------------
+# Incremental re-indexing & persistence
+# ------------------------
+def test_unchanged_document_is_skipped(tmp_path):
+    idx = CourseIndex("X", tmp_path)
+    assert idx.add_document("a.txt", b"pumps and valves") is True
+    assert idx.add_document("a.txt", b"pumps and valves") is False
+    assert len(idx.chunks) == 1
+
+
+def test_changed_document_replaces_only_its_chunks(tmp_path):
+    idx = CourseIndex("X", tmp_path)
+    idx.add_document("a.txt", b"pumps and valves")
+    idx.add_document("b.txt", b"turbines")
+    idx.add_document("a.txt", b"compressors")
+    assert sorted(c["text"] for c in idx.chunks) == ["compressors", "turbines"]
+    assert "pumps" not in idx.df and idx.df["compressors"] == 1
+
+
+def test_remove_document_updates_document_frequencies(tmp_path):
+    idx = CourseIndex("X", tmp_path)
+    idx.add_document("a.txt", b"pumps valves")
+    idx.add_document("b.txt", b"pumps")
+    idx.remove_document("a.txt")
+    assert idx.df == {"pumps": 1}
+    assert list(idx.docs) == ["b.txt"]
+
+
+def test_index_persists_and_reloads(tmp_path):
+    idx = CourseIndex("CT5/SET 1", tmp_path)
+    idx.add_document("a.txt", b"distillation column reflux")
+    idx.save()
+    assert idx.path.parent == tmp_path and "/" not in idx.path.name
+    again = CourseIndex("CT5/SET 1", tmp_path)
+    assert again.docs == idx.docs
+    assert again.search("reflux")[0]["source"] == "a.txt"
+
+
+def test_corrupt_index_file_starts_empty(tmp_path):
+    (tmp_path / "X.json").write_text("{not json", encoding="utf-8")
+    assert CourseIndex("X", tmp_path).chunks == []
+
+
+def test_index_uploads_counts_and_only_saves_on_change(tmp_path):
+    files = [("a.txt", b"pumps"), ("b.pdf", b"%PDF")]
+    assert index_uploads("X", files, tmp_path) == {"added": 1, "unchanged": 0, "skipped": 1, "chunks": 1}
+    saved = (tmp_path / "X.json").stat().st_mtime_ns
+    assert index_uploads("X", files, tmp_path) == {"added": 0, "unchanged": 1, "skipped": 1, "chunks": 1}
+    assert (tmp_path / "X.json").stat().st_mtime_ns == saved
+    assert json.loads((tmp_path / "X.json").read_text())["docs"].keys() == {"a.txt"}
+
+
+def test_retrieve_context_without_course(tmp_path):
+    assert retrieve_context(None, "pumps", root=tmp_path) == []
+    index_uploads("X", [("a.txt", b"pumps")], tmp_path)
+    assert retrieve_context("X", "pumps", root=tmp_path) == ["pumps"]
+
+
+def test_retrieve_for_topics_interleaves_and_dedupes(tmp_path):
+    idx = CourseIndex("X", tmp_path)
+    for i in range(4):
+        idx.add_document(f"heat{i}.txt", f"heat exchanger heat transfer note {i}".encode())
+    idx.add_document("flow.txt", b"pipe flow and pressure")
+    idx.save()
+    merged = retrieve_for_topics("X", ["heat exchanger", "pipe flow", "heat"], 3, tmp_path)
+    assert len(merged) == 3 and len(set(merged)) == 3
+    assert merged[1] == "pipe flow and pressure"
+    assert retrieve_for_topics(None, ["heat"], 3, tmp_path) == []
@@ -0,0 +1,171 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import ThreadingHTTPServer
+from urllib import error, request
+
+import pytest
+
+import ai_pipeline
+import generation_service
+from generation_service import GenerationService, Handler
+
+
+def mcq(i, topic):
+    options = ["Impeller", "Casing", "Shaft", "Seal"]
+    return {"question": f"Identify part {i} of {topic}.", "options": options, "answer": "ABCD"[i % 4]}
+
+
+class FakeBatch:
+    """Stands in for ai_pipeline.abrainstorm_batch and records each call."""
+
+    def __init__(self, items=None, delay=0.0):
+        self.calls = []
+        self.items = items
+        self.delay = delay
+        self.started = threading.Event()
+
+    async def __call__(self, topics, bloom, count=10, course_code=None, kind="questions",
+                       stats=None, material=None, verbs=None):
+        self.calls.append(list(topics))
+        self.started.set()
+        await asyncio.sleep(self.delay)
+        return {t: self.items if self.items is not None else [mcq(i, t) for i in range(count)]
+                for t in topics}
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    batch = FakeBatch()
+    monkeypatch.setattr(ai_pipeline, "abrainstorm_batch", batch)
+    monkeypatch.setattr(generation_service, "BATCH_WINDOW_S", 0.05)
+    return batch
+
+
+@pytest.fixture
+def service(fake):
+    svc = GenerationService()
+    svc.start()
+    yield svc
+    svc.stop()
+
+
+def spec(*topics, **extra):
+    return {"topics": list(topics), "bloom": "Low", "count": 2, **extra}
+
+
+def wait_done(svc, job_id, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = svc.get(job_id)
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} still {job['status']}")
+
+
+# ------------------------
+# Batching & caching
+# ------------------------
+def test_jobs_with_same_parameters_share_one_batch(service, fake):
+    a = service.submit(spec("Pumps"))
+    b = service.submit(spec("Valves", "Pumps"))
+    ja, jb = wait_done(service, a), wait_done(service, b)
+    assert fake.calls == [["Pumps", "Valves"]]
+    assert ja["status"] == jb["status"] == "done"
+    assert set(jb["result"]) == {"Valves", "Pumps"} and len(ja["result"]["Pumps"]) == 2
+
+
+def test_different_parameters_are_separate_batches(service, fake):
+    a = service.submit(spec("Pumps"))
+    b = service.submit(spec("Pumps", bloom="High"))
+    wait_done(service, a), wait_done(service, b)
+    assert sorted(fake.calls) == [["Pumps"], ["Pumps"]]
+
+
+def test_cached_topics_return_immediately_unless_fresh(service, fake):
+    wait_done(service, service.submit(spec("Pumps")))
+    assert service.get(service.submit(spec("Pumps")))["status"] == "done"
+    assert len(fake.calls) == 1
+    wait_done(service, service.submit(spec("Pumps", fresh=True)))
+    assert len(fake.calls) == 2
+
+
+@pytest.mark.parametrize("items", [
+    [{"error": "Invalid JSON returned"}],
+    [],
+    [{"question": "Identify the pump.", "options": ["a", "a", "b", "c"], "answer": "A"}],
+])
+def test_unusable_results_are_not_cached(service, fake, items):
+    fake.items = items
+    assert wait_done(service, service.submit(spec("Pumps")))["result"] == {"Pumps": items}
+    wait_done(service, service.submit(spec("Pumps")))
+    assert len(fake.calls) == 2
+
+
+# ------------------------
+# Cancellation
+# ------------------------
+def test_cancel_running_job(service, fake):
+    fake.delay = 5
+    job_id = service.submit(spec("Pumps"))
+    assert fake.started.wait(2)
+    assert service.cancel(job_id) is True
+    assert service.get(job_id)["status"] == "cancelled"
+    assert service.cancel(job_id) is False
+    deadline = time.monotonic() + 2
+    while service.tasks and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not service.tasks  # batch task cancelled once no job wanted it
+
+
+def test_cancel_keeps_batch_for_other_jobs(service, fake):
+    fake.delay = 0.2
+    a = service.submit(spec("Pumps"))
+    b = service.submit(spec("Pumps"))
+    assert fake.started.wait(2)
+    service.cancel(a)
+    assert wait_done(service, b)["status"] == "done"
+    assert service.get(a)["status"] == "cancelled"
+
+
+def test_cancel_unknown_or_finished_job(service):
+    assert service.cancel("nope") is False
+    job_id = service.submit(spec("Pumps"))
+    wait_done(service, job_id)
+    assert service.cancel(job_id) is False
+
+
+# ------------------------
+# Validation
+# ------------------------
+@pytest.mark.parametrize("bad", [
+    [], "Pumps", None,
+    {"topics": "Pumps", "bloom": "Low"},
+    {"topics": [], "bloom": "Low"},
+    {"topics": ["Pumps"], "bloom": "Apply"},
+    {"topics": ["Pumps"], "bloom": "Low", "verbs": ["design"]},
+    {"topics": ["Pumps"], "bloom": "Low", "count": 0},
+    {"topics": ["Pumps"], "bloom": "Low", "kind": "essays"},
+    {"topics": ["Pumps"], "bloom": "Low", "material": "text"},
+])
+def test_invalid_specs_are_rejected(bad):
+    with pytest.raises((ValueError, TypeError)):
+        generation_service._parse_spec(bad)
+
+
+def test_http_rejects_non_object_body_with_400(service):
+    Handler.service = service
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/jobs"
+        for body in ([1, 2], "Pumps", {"topics": "Pumps", "bloom": "Low"}):
+            req = request.Request(url, data=json.dumps(body).encode(), method="POST")
+            with pytest.raises(error.HTTPError) as e:
+                request.urlopen(req, timeout=5)
+            assert e.value.code == 400
+    finally:
+        server.shutdown()
+        server.server_close()
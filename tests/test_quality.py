@@ -0,0 +1,135 @@
+import numpy as np
+import pytest
+
+from quality import failing_indices, score_batch, verb_forms
+
+
+def mcq(stem="Identify the main part of a pump.", options=None, answer="A", **extra):
+    item = {"question": stem, "options": options or ["Impeller", "Casing", "Shaft", "Seal"], "answer": answer}
+    item.update(extra)
+    return item
+
+
+def reasons(items, level="Low", verbs=None):
+    return score_batch(items, level, verbs)["reasons"]
+
+
+# ------------------------
+# Empty & malformed input
+# ------------------------
+def test_empty_batch():
+    r = score_batch([], "Low")
+    assert r["scores"].shape == (0,) and r["passed"].shape == (0,)
+    assert r["reasons"] == [] and failing_indices(r) == []
+    assert r["answer_distribution"] == {"A": 0, "B": 0, "C": 0, "D": 0}
+    assert r["answer_skewed"] is False
+
+
+@pytest.mark.parametrize("item", ["junk", None, {}, {"error": "Invalid JSON returned"}, {"question": "Define x", "options": "abcd"}])
+def test_malformed_items_fail_structure(item):
+    r = score_batch([item], "Low")
+    assert not r["passed"][0]
+    assert "structure" in r["reasons"][0]
+
+
+def test_unknown_level_is_rejected():
+    with pytest.raises(ValueError):
+        score_batch([mcq()], "Apply")
+
+
+# ------------------------
+# Individual checks
+# ------------------------
+def test_good_item_passes_with_full_score():
+    r = score_batch([mcq(bloom_level="Low")], "Low")
+    assert r["passed"].tolist() == [True]
+    assert r["scores"][0] == pytest.approx(1.0)
+
+
+def test_wrong_option_count_and_empty_option():
+    assert "structure" in reasons([mcq(options=["a", "b", "c"])])[0]
+    assert "structure" in reasons([mcq(options=["Impeller", "", "Shaft", "Seal"])])[0]
+    assert "structure" in reasons([mcq(stem="")])[0]
+
+
+@pytest.mark.parametrize("answer,ok", [("A", True), ("d", True), ("B)", True), ("E", False), ("", False), ("AB", False)])
+def test_answer_letter(answer, ok):
+    assert ("answer_letter" not in reasons([mcq(answer=answer)])[0]) is ok
+
+
+def test_duplicate_options_ignore_labels_case_and_punctuation():
+    assert "unique_options" in reasons([mcq(options=["A) Pump", "b. pump!", "Valve", "Seal"])])[0]
+    assert "unique_options" not in reasons([mcq(options=["A) Pump", "B) Valve", "C) Seal", "D) Shaft"])])[0]
+    assert "unique_options" in reasons([mcq(options=["Pump  valve", "pump valve.", "Seal", "Shaft"])])[0]
+
+
+@pytest.mark.parametrize("options", [
+    ["-5 °C", "5 °C", "10 °C", "15 °C"],
+    ["1.5", "15", "0.15", "150"],
+    ["1/2", "12", "-12", "+12"],
+])
+def test_numeric_options_with_signs_and_decimals_are_distinct(options):
+    assert "unique_options" not in reasons([mcq(options=options)])[0]
+
+
+def test_bloom_level_mismatch_fails_missing_passes():
+    assert "bloom_level" in reasons([mcq(bloom_level="High")])[0]
+    assert "bloom_level" not in reasons([mcq(bloom_level="low")])[0]
+    assert "bloom_level" not in reasons([mcq()])[0]
+
+
+def test_length_balance_and_answer_giveaway():
+    long = "A very long and detailed correct option"
+    r = reasons([mcq(options=[long, "Casing", "Shaft", "Seal"], answer="A")])[0]
+    assert "length_balanced" in r and "answer_not_longest" in r
+    r = reasons([mcq(options=["Impeller", long, "Shaft", "Seal"], answer="A")])[0]
+    assert "answer_not_longest" not in r
+
+
+# ------------------------
+# Verb alignment
+# ------------------------
+def test_verb_forms_inflections_and_british_spelling():
+    assert verb_forms("identify") == ["identify", "identifies", "identified", "identifying"]
+    assert verb_forms("solve") == ["solve", "solves", "solved", "solving"]
+    assert verb_forms("match") == ["match", "matches", "matched", "matching"]
+    assert "analysing" in verb_forms("analyze") and "optimise" in verb_forms("optimize")
+
+
+@pytest.mark.parametrize("stem,level", [
+    ("Which apple is red?", "Medium"),
+    ("What is a solvent?", "Medium"),
+    ("Listen to the pump.", "Low"),
+    ("Which creature is shown?", "High"),
+])
+def test_verb_prefixes_inside_other_words_do_not_match(stem, level):
+    assert "verb_aligned" in reasons([mcq(stem=stem)], level)[0]
+
+
+@pytest.mark.parametrize("stem", ["Apply Bernoulli's law.", "Analyse the data.", "Solving for x, which is right?"])
+def test_verb_inflections_match(stem):
+    assert "verb_aligned" not in reasons([mcq(stem=stem)], "Medium")[0]
+
+
+def test_selected_verbs_narrow_alignment():
+    item = mcq(stem="Compare the two pumps.")
+    assert "verb_aligned" not in reasons([item], "Medium")[0]
+    assert "verb_aligned" in reasons([item], "Medium", ["apply"])[0]
+
+
+# ------------------------
+# Batch-level answer distribution
+# ------------------------
+def test_answer_distribution_and_skew():
+    r = score_batch([mcq(answer="A")] * 3 + [mcq(answer="B"), mcq(answer="Z")], "Low")
+    assert r["answer_distribution"] == {"A": 3, "B": 1, "C": 0, "D": 0}
+    assert r["answer_skewed"] is True
+    balanced = score_batch([mcq(answer=l) for l in "ABCD"], "Low")
+    assert balanced["answer_skewed"] is False
+
+
+def test_failing_indices_and_vectorised_shapes():
+    items = [mcq(), mcq(answer="E"), mcq(), mcq(options=["a", "a", "b", "c"])]
+    r = score_batch(items, "Low")
+    assert failing_indices(r) == [1, 3]
+    assert isinstance(r["passed"], np.ndarray) and r["scores"].shape == (4,)